@@ -1,10 +1,16 @@
 """Authentication module for CourseAlign API."""
+import hashlib
+import hmac
+from cachetools import TTLCache
 from fastapi import HTTPException, Security
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.config import config
 
 security = HTTPBearer()
 
+# Recently verified tokens, keyed by token hash so raw secrets are never stored
+_verified_tokens = TTLCache(maxsize=1024, ttl=60)
+
 
 async def verify_token(credentials: HTTPAuthorizationCredentials = Security(security)) -> str:
     """
@@ -25,10 +31,16 @@ async def verify_token(credentials: HTTPAuthorizationCredentials = Security(secu
             detail="API secret not configured on server"
         )
     
-    if credentials.credentials != config.api_secret:
+    token_key = hashlib.sha256(credentials.credentials.encode()).hexdigest()[:32]
+    if token_key in _verified_tokens:
+        return credentials.credentials
+    
+    # Constant-time comparison to avoid leaking the secret through timing
+    if not hmac.compare_digest(credentials.credentials.encode(), config.api_secret.encode()):
         raise HTTPException(
             status_code=401,
             detail="Invalid authentication credentials"
         )
     
+    _verified_tokens[token_key] = True
     return credentials.credentials
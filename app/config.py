@@ -14,6 +14,8 @@ class Config:
     def __init__(self):
         self.openai_api_key = os.getenv("OPENAI_API_KEY")
         self.api_secret = os.getenv("COURSEALIGN_API_SECRET")
+        # Processes used to extract large textbook PDFs; 0 means one per CPU this process may run on
+        self.extract_workers = int(os.getenv("EXTRACT_WORKERS", "0"))
         self.courses: Dict[str, Any] = {}
         self._load_courses()
     
@@ -2,9 +2,20 @@
 from docx import Document
 from docx.shared import Pt, Inches, RGBColor
 from docx.enum.text import WD_ALIGN_PARAGRAPH
+from docx.oxml import parse_xml
+from docx.oxml.ns import nsdecls
 from io import BytesIO
+from typing import List, Tuple
+from xml.sax.saxutils import escape
 import re
 
+# Numbered section headings (e.g. "1. CONCEPT MAP")
+_MAIN_HEADING_RE = re.compile(r'^\d+\.\s+[A-Z\s]+$')
+# Splits text around **bold** spans, keeping the spans
+_BOLD_SPLIT_RE = re.compile(r'(\*\*.*?\*\*)')
+# Characters a run renders as elements rather than text
+_RUN_SPECIAL_RE = re.compile(r'([\t\r\n])')
+
 
 class DOCXWriter:
     """Creates formatted DOCX Study Context Guides."""
@@ -14,7 +25,7 @@ class DOCXWriter:
         content: str, 
         slides_filename: str = "Lecture Deck",
         course_code: str = ""
-    ) -> bytes:
+    ) -> BytesIO:
         """
         Create a formatted DOCX from study guide content.
         
@@ -24,7 +35,7 @@ class DOCXWriter:
             course_code: Course code
             
         Returns:
-            DOCX file as bytes
+            Buffer holding the DOCX file, positioned at the start
         """
         doc = Document()
         
@@ -53,22 +64,73 @@ class DOCXWriter:
         # Parse and format content
         self._parse_and_format_content(doc, content)
         
-        # Save to bytes
-        docx_bytes = BytesIO()
-        doc.save(docx_bytes)
-        docx_bytes.seek(0)
+        # Save to an in-memory buffer; callers stream it without copying
+        docx_buffer = BytesIO()
+        doc.save(docx_buffer)
+        docx_buffer.seek(0)
         
-        return docx_bytes.getvalue()
+        return docx_buffer
     
     def _parse_and_format_content(self, doc: Document, content: str):
         """
         Parse markdown-like content and format it in the document.
         
+        Lines are classified in a single pass, rendered to paragraph XML and
+        appended to the body in one batch rather than through per-line
+        python-docx calls.
+        
         Args:
             doc: Document object
             content: Text content to parse
         """
+        # Resolve style ids once instead of per paragraph
+        style_ids = {
+            "heading_1": doc.styles['Heading 1'].style_id,
+            "heading_2": doc.styles['Heading 2'].style_id,
+            "bullet": doc.styles['List Bullet'].style_id,
+            "paragraph": None,
+            "spacing": None
+        }
+        
+        paragraphs_xml = []
+        for kind, text in self._classify_lines(content):
+            if kind in ("heading_1", "heading_2"):
+                # Headings are plain text, without inline formatting
+                runs = [(text, False)] if text else []
+            elif kind == "spacing":
+                runs = []
+            else:
+                runs = self._formatted_runs(text)
+            
+            paragraphs_xml.append(self._paragraph_xml(style_ids[kind], runs))
+        
+        if not paragraphs_xml:
+            return
+        
+        body = doc.element.body
+        fragment = parse_xml(f'<w:body {nsdecls("w")}>{"".join(paragraphs_xml)}</w:body>')
+        
+        # Paragraphs must precede the body's trailing section properties
+        sect_pr = body.sectPr
+        for paragraph in list(fragment):
+            if sect_pr is not None:
+                sect_pr.addprevious(paragraph)
+            else:
+                body.append(paragraph)
+    
+    def _classify_lines(self, content: str) -> List[Tuple[str, str]]:
+        """
+        Classify each line of markdown-like content.
+        
+        Args:
+            content: Text content to parse
+            
+        Returns:
+            List of (kind, text) tuples, where kind is heading_1, heading_2,
+            bullet, paragraph or spacing
+        """
         lines = content.split('\n')
+        classified = []
         i = 0
         
         while i < len(lines):
@@ -76,42 +138,41 @@ class DOCXWriter:
             
             # Main headings (typically numbered or all caps)
             if self._is_main_heading(line):
-                doc.add_heading(line.strip('#').strip(), level=1)
+                classified.append(("heading_1", line.strip('#').strip()))
             
             # Sub-headings (bold text with ** or ##)
             elif line.strip().startswith('##') or (line.strip().startswith('**') and line.strip().endswith('**')):
                 heading_text = line.strip('#').strip('*').strip()
-                doc.add_heading(heading_text, level=2)
+                classified.append(("heading_2", heading_text))
             
             # Bold text inline
             elif '**' in line and line.strip():
-                para = doc.add_paragraph()
-                self._add_formatted_text(para, line)
+                classified.append(("paragraph", line))
             
             # Bullet points
             elif line.strip().startswith(('-', '•', '*')) and len(line.strip()) > 2:
                 text = line.strip().lstrip('-•*').strip()
-                para = doc.add_paragraph(style='List Bullet')
-                self._add_formatted_text(para, text)
+                classified.append(("bullet", text))
             
             # Regular paragraph
             elif line.strip():
-                para = doc.add_paragraph()
-                self._add_formatted_text(para, line)
+                classified.append(("paragraph", line))
             
             # Empty line - add spacing
             else:
                 if i > 0 and lines[i-1].strip():  # Only add spacing if previous line had content
-                    doc.add_paragraph()
+                    classified.append(("spacing", ""))
             
             i += 1
+        
+        return classified
     
     def _is_main_heading(self, line: str) -> bool:
         """Check if line is a main heading."""
         line = line.strip()
         
-        # Numbered sections (1. CONCEPT MAP)
-        if re.match(r'^\d+\.\s+[A-Z\s]+$', line):
+        # Numbered sections (1. CONCEPT MAP); only lines starting with a digit can match
+        if line[:1].isdigit() and _MAIN_HEADING_RE.match(line):
             return True
         
         # All caps headings
@@ -124,22 +185,45 @@ class DOCXWriter:
         
         return False
     
-    def _add_formatted_text(self, paragraph, text: str):
+    def _formatted_runs(self, text: str) -> List[Tuple[str, bool]]:
         """
-        Add text to paragraph with inline formatting (bold, etc.).
+        Split text into runs with inline formatting (bold, etc.).
         
         Args:
-            paragraph: Paragraph object
             text: Text with markdown-like formatting
+            
+        Returns:
+            List of (run_text, is_bold) tuples
         """
-        # Split by ** for bold sections
-        parts = re.split(r'(\*\*.*?\*\*)', text)
+        runs = []
         
-        for part in parts:
+        # Split by ** for bold sections
+        for part in _BOLD_SPLIT_RE.split(text):
             if part.startswith('**') and part.endswith('**'):
                 # Bold text
-                run = paragraph.add_run(part.strip('*'))
-                run.font.bold = True
+                runs.append((part.strip('*'), True))
             else:
                 # Regular text
-                paragraph.add_run(part)
+                runs.append((part, False))
+        
+        return runs
+    
+    def _paragraph_xml(self, style_id: str, runs: List[Tuple[str, bool]]) -> str:
+        """Render a paragraph with an optional style and runs as WordprocessingML."""
+        properties = f'<w:pPr><w:pStyle w:val="{style_id}"/></w:pPr>' if style_id else ''
+        runs_xml = "".join(self._run_xml(text, bold) for text, bold in runs)
+        return f'<w:p>{properties}{runs_xml}</w:p>'
+    
+    def _run_xml(self, text: str, bold: bool) -> str:
+        """Render a text run, mapping tabs and line breaks like python-docx does."""
+        content = []
+        for piece in _RUN_SPECIAL_RE.split(text):
+            if piece == '\t':
+                content.append('<w:tab/>')
+            elif piece in ('\r', '\n'):
+                content.append('<w:br/>')
+            elif piece:
+                content.append(f'<w:t xml:space="preserve">{escape(piece)}</w:t>')
+        
+        properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+        return f'<w:r>{properties}{"".join(content)}</w:r>'
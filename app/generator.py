@@ -1,15 +1,28 @@
 """Study guide generator module using OpenAI."""
-from typing import List, Dict, Any
-from openai import OpenAI
+import hashlib
+import json
+from typing import List, Dict, Any, Iterator
+from cachetools import TTLCache
+from openai import AsyncOpenAI
 from app.config import config
+from app.retry import openai_retry
+from app.tokenizer import get_encoding
+
+SLIDE_TOKEN_BUDGET = 20000
+CHUNK_TOKEN_BUDGET = 40000
+
+# Decks per batched request; each guide gets up to 4000 of the 16K output tokens
+MAX_BATCH_DECKS = 4
 
 
 class StudyGuideGenerator:
     """Generates study context guides using OpenAI chat completion."""
     
     def __init__(self):
-        self.client = OpenAI(api_key=config.openai_api_key)
+        self.client = AsyncOpenAI(api_key=config.openai_api_key, max_retries=0)
         self.model = "gpt-4o-mini"
+        # Generated guides keyed by slide content, so re-uploads skip the LLM call
+        self._guide_cache = TTLCache(maxsize=256, ttl=86400)
     
     def create_system_prompt(self) -> str:
         """Create the system prompt for the CourseAlign specialist."""
@@ -82,63 +95,168 @@ Remember: Academic integrity requires precise citations. Only reference what you
         Returns:
             Formatted user prompt
         """
-        # Format retrieved chunks
-        chunks_text = self._format_chunks(retrieved_chunks)
-        
-        # Format key concepts
-        concepts_text = "\n".join([f"- {concept}" for concept in key_concepts[:15]])
+        deck_content = self._format_deck_content(
+            slide_text,
+            key_concepts,
+            retrieved_chunks,
+            SLIDE_TOKEN_BUDGET,
+            CHUNK_TOKEN_BUDGET
+        )
         
         prompt = f"""
 COURSE: {course_code}
 
-LECTURE SLIDES CONTENT:
-{slide_text[:4000]}  {f'... [truncated, total length: {len(slide_text)} chars]' if len(slide_text) > 4000 else ''}
+{deck_content}
 
-KEY CONCEPTS IDENTIFIED:
-{concepts_text}
+---
 
-RETRIEVED TEXTBOOK CHUNKS:
-{chunks_text}
+Please create a comprehensive Study Context Guide following your role instructions. Ensure all textbook information includes page citations from the chunk metadata above. Be thorough but grounded exclusively in the provided material.
+"""
+        return prompt
+    
+    def create_batch_user_prompt(
+        self,
+        course_code: str,
+        decks: List[Dict[str, Any]]
+    ) -> str:
+        """
+        Create a single user prompt covering several lecture decks.
+        
+        Args:
+            course_code: Course code
+            decks: List of dicts with slide_text, key_concepts, retrieved_chunks
+            
+        Returns:
+            Formatted user prompt asking for one guide per deck as JSON
+        """
+        # Share the prompt budgets across decks to stay inside the context window
+        slide_budget = SLIDE_TOKEN_BUDGET // len(decks)
+        chunk_budget = CHUNK_TOKEN_BUDGET // len(decks)
+        
+        deck_sections = []
+        for deck_id, deck in enumerate(decks, 1):
+            deck_content = self._format_deck_content(
+                deck["slide_text"],
+                deck["key_concepts"],
+                deck["retrieved_chunks"],
+                slide_budget,
+                chunk_budget
+            )
+            deck_sections.append(f"---DECK {deck_id}---\n\n{deck_content}")
+        
+        decks_text = "\n\n".join(deck_sections)
+        
+        prompt = f"""
+COURSE: {course_code}
+
+The following {len(decks)} lecture decks are delimited by ---DECK N--- markers. Each deck has its own slides, key concepts and retrieved textbook chunks.
+
+{decks_text}
 
 ---
 
-Please create a comprehensive Study Context Guide following your role instructions. Ensure all textbook information includes page citations from the chunk metadata above. Be thorough but grounded exclusively in the provided material.
+Please create a separate, comprehensive Study Context Guide for each deck following your role instructions, using only that deck's textbook chunks. Ensure all textbook information includes page citations from the chunk metadata. Be thorough but grounded exclusively in the provided material.
+
+Respond with a JSON object of the form {{"guides": [{{"deck_id": 1, "content": "..."}}, ...]}} containing one entry per deck, where "content" is the full study guide text for that deck.
 """
         return prompt
     
-    def _format_chunks(self, chunks: List[Dict[str, Any]]) -> str:
-        """Format chunks for the prompt."""
-        formatted = []
+    def _format_deck_content(
+        self,
+        slide_text: str,
+        key_concepts: List[str],
+        retrieved_chunks: List[Dict[str, Any]],
+        slide_budget: int,
+        chunk_budget: int
+    ) -> str:
+        """Format the slides, key concepts and chunks sections for one deck."""
+        # Format retrieved chunks
+        chunks_text = self._format_chunks(retrieved_chunks, chunk_budget)
+        
+        # Trim slides to the token budget rather than an arbitrary char count
+        encoding = get_encoding()
+        slide_tokens = encoding.encode(slide_text, disallowed_special=())
+        if len(slide_tokens) > slide_budget:
+            slide_content = encoding.decode(slide_tokens[:slide_budget])
+            slide_content += f"  ... [truncated, total length: {len(slide_tokens)} tokens]"
+        else:
+            slide_content = slide_text
+        
+        # Format key concepts
+        concepts_text = "\n".join([f"- {concept}" for concept in key_concepts[:15]])
+        
+        return f"""LECTURE SLIDES CONTENT:
+{slide_content}
+
+KEY CONCEPTS IDENTIFIED:
+{concepts_text}
+
+RETRIEVED TEXTBOOK CHUNKS:
+{chunks_text}"""
+    
+    def _format_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        token_budget: int = CHUNK_TOKEN_BUDGET
+    ) -> str:
+        """Format chunks for the prompt, stopping at the chunk token budget."""
+        return "\n".join(self._iter_chunks(chunks, token_budget))
+    
+    def _iter_chunks(
+        self,
+        chunks: List[Dict[str, Any]],
+        token_budget: int = CHUNK_TOKEN_BUDGET
+    ) -> Iterator[str]:
+        """Yield formatted chunk blocks in rank order until the token budget is spent."""
+        encoding = get_encoding()
+        tokens_used = 0
         
         for i, chunk in enumerate(chunks, 1):
             page_info = f"{chunk['page_start']}-{chunk['page_end']}" if chunk['page_start'] != chunk['page_end'] else str(chunk['page_start'])
             
-            formatted.append(f"""
-[CHUNK {i}] - Pages {page_info}
-{chunk['text']}
-""")
-        
-        return "\n".join(formatted)
+            header = f"\n[CHUNK {i}] - Pages {page_info}\n"
+            block = f"{header}{chunk['text']}\n"
+            
+            # Chunk text is tokenized at index time; only the short header is encoded here
+            text_tokens = chunk.get("token_count")
+            if text_tokens is None:
+                text_tokens = len(encoding.encode(chunk['text'], disallowed_special=()))
+            
+            # Chunks arrive ranked, so drop the least relevant ones once over budget
+            tokens_used += len(encoding.encode(header)) + text_tokens + 1
+            if tokens_used > token_budget:
+                return
+            
+            yield block
     
-    def generate_study_guide(
+    async def generate_study_guide(
         self,
         course_code: str,
         slide_text: str,
         key_concepts: List[str],
-        retrieved_chunks: List[Dict[str, Any]]
+        retrieved_chunks: List[Dict[str, Any]],
+        index_generation: int = 0
     ) -> str:
         """
         Generate study guide using OpenAI chat completion.
         
+        Results are cached for 24 hours by course, index build and slide content.
+        
         Args:
             course_code: Course code
             slide_text: Full text from slides
             key_concepts: List of key concepts
             retrieved_chunks: Retrieved textbook chunks
+            index_generation: Identifier of the course index build the chunks came from
             
         Returns:
             Generated study guide text
         """
+        cache_key = self._cache_key(course_code, index_generation, slide_text)
+        cached_guide = self._guide_cache.get(cache_key)
+        if cached_guide is not None:
+            return cached_guide
+        
         system_prompt = self.create_system_prompt()
         user_prompt = self.create_user_prompt(
             course_code,
@@ -147,7 +265,7 @@ Please create a comprehensive Study Context Guide following your role instructio
             retrieved_chunks
         )
         
-        response = self.client.chat.completions.create(
+        response = await self._create_completion(
             model=self.model,
             messages=[
                 {"role": "system", "content": system_prompt},
@@ -157,4 +275,83 @@ Please create a comprehensive Study Context Guide following your role instructio
             max_tokens=4000
         )
         
-        return response.choices[0].message.content
+        study_guide = response.choices[0].message.content
+        self._guide_cache[cache_key] = study_guide
+        return study_guide
+    
+    async def generate_study_guides_batch(
+        self,
+        course_code: str,
+        decks: List[Dict[str, Any]],
+        index_generation: int = 0
+    ) -> List[str]:
+        """
+        Generate study guides for several decks with a single chat completion.
+        
+        Decks already in the guide cache are not sent to the model.
+        
+        Args:
+            course_code: Course code
+            decks: List of dicts with slide_text, key_concepts, retrieved_chunks
+            index_generation: Identifier of the course index build the chunks came from
+            
+        Returns:
+            Generated study guide text for each deck, in input order
+        """
+        if len(decks) > MAX_BATCH_DECKS:
+            raise ValueError(f"At most {MAX_BATCH_DECKS} decks can be processed per batch")
+        
+        cache_keys = [self._cache_key(course_code, index_generation, deck["slide_text"]) for deck in decks]
+        guides = [self._guide_cache.get(key) for key in cache_keys]
+        pending = [i for i, guide in enumerate(guides) if guide is None]
+        
+        if not pending:
+            return guides
+        
+        system_prompt = self.create_system_prompt()
+        user_prompt = self.create_batch_user_prompt(
+            course_code,
+            [decks[i] for i in pending]
+        )
+        
+        response = await self._create_completion(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            temperature=0.3,  # Lower temperature for more consistent, factual output
+            max_tokens=4000 * len(pending),
+            response_format={"type": "json_object"}
+        )
+        
+        # A truncated response is cut off mid-JSON, so report it instead of a parse error
+        if response.choices[0].finish_reason == "length":
+            raise ValueError(
+                f"Model response was truncated at the token limit while generating "
+                f"{len(pending)} study guides; submit fewer decks per batch"
+            )
+        
+        generated = json.loads(response.choices[0].message.content)
+        content_by_deck = {
+            int(guide["deck_id"]): guide["content"]
+            for guide in generated.get("guides", [])
+        }
+        
+        # deck_id is the 1-based position within the pending decks
+        for deck_id, i in enumerate(pending, 1):
+            if deck_id not in content_by_deck:
+                raise ValueError(f"Model response is missing the guide for deck {deck_id}")
+            guides[i] = content_by_deck[deck_id]
+            self._guide_cache[cache_keys[i]] = guides[i]
+        
+        return guides
+    
+    @openai_retry
+    async def _create_completion(self, **kwargs):
+        """Create a chat completion, retrying transient API errors with backoff."""
+        return await self.client.chat.completions.create(**kwargs)
+    
+    def _cache_key(self, course_code: str, index_generation: int, slide_text: str) -> str:
+        """Cache key for a generated guide; a rebuilt index yields new keys."""
+        return hashlib.sha256(f"{course_code}\n{index_generation}\n{slide_text}".encode()).hexdigest()
@@ -1,17 +1,22 @@
 """FastAPI main application for CourseAlign API."""
+import asyncio
 import os
 import tempfile
-from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form
-from fastapi.responses import Response
-from typing import Optional
+import zipfile
+from io import BytesIO
+from fastapi import FastAPI, HTTPException, Depends, UploadFile, File, Form, Response
+from fastapi.responses import StreamingResponse
+from typing import Iterator, List, Optional
+from openai import NotFoundError
+import faiss
 import logging
 
 from app.auth import verify_token
 from app.config import config
-from app.pdf_indexer import PDFIndexer
+from app.pdf_indexer import PDFIndexer, SYNC_INDEX_MAX_PAGES
 from app.pptx_parser import PPTXParser
 from app.rag import RAGRetriever
-from app.generator import StudyGuideGenerator
+from app.generator import StudyGuideGenerator, MAX_BATCH_DECKS
 from app.docx_writer import DOCXWriter
 
 # Configure logging
@@ -28,10 +33,54 @@ app = FastAPI(
 # Initialize components
 pdf_indexer = PDFIndexer()
 pptx_parser = PPTXParser()
-rag_retriever = RAGRetriever()
+rag_retriever = RAGRetriever(pdf_indexer)
 study_guide_generator = StudyGuideGenerator()
 docx_writer = DOCXWriter()
 
+UPLOAD_CHUNK_SIZE = 1 << 20  # 1MB
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+
+async def save_upload_to_tempfile(upload: UploadFile, suffix: str) -> str:
+    """
+    Stream an uploaded file to a temporary file without loading it into memory.
+    
+    Args:
+        upload: Uploaded file
+        suffix: Temporary file suffix (e.g. '.pdf')
+        
+    Returns:
+        Path to the temporary file
+    """
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as temp_file:
+        while chunk := await upload.read(UPLOAD_CHUNK_SIZE):
+            temp_file.write(chunk)
+        return temp_file.name
+
+
+def iter_buffer(buffer: BytesIO) -> Iterator[bytes]:
+    """Yield a buffer's contents in fixed-size chunks for a streaming response."""
+    while chunk := buffer.read(DOWNLOAD_CHUNK_SIZE):
+        yield chunk
+
+
+@app.on_event("startup")
+async def preload_indexes():
+    """Load every existing course index into memory before serving requests."""
+    # Quantized index scans rely on SIMD kernels; without AVX2 FAISS falls back to scalar code
+    instruction_sets = faiss.supported_instruction_sets()
+    if "AVX2" not in instruction_sets and "NEON" not in instruction_sets:
+        logger.warning("FAISS SIMD kernels unavailable; index search uses the scalar fallback")
+    
+    for course_code in config.get_all_course_codes():
+        if not pdf_indexer.index_exists(course_code):
+            continue
+        try:
+            pdf_indexer.load_index(course_code)
+            logger.info(f"Loaded index for course {course_code}")
+        except Exception as e:
+            logger.error(f"Error loading index for course {course_code}: {str(e)}")
+
 
 @app.get("/health")
 async def health_check():
@@ -63,8 +112,9 @@ async def get_courses():
     }
 
 
-@app.post("/index-textbook")
+@app.post("/index-textbook", status_code=202)
 async def index_textbook(
+    response: Response,
     course_code: str = Form(...),
     textbook_pdf: UploadFile = File(...),
     _: str = Depends(verify_token)
@@ -72,12 +122,16 @@ async def index_textbook(
     """
     Index a textbook PDF for a course.
     
+    Short PDFs are embedded directly and indexed before this returns.
+    Longer ones are embedded through the OpenAI Batch API, so this returns
+    as soon as the job is submitted. Poll /index-status/{job_id} to finish.
+    
     Args:
         course_code: Course code (must match courses.json)
         textbook_pdf: PDF file to index
         
     Returns:
-        Indexing statistics
+        Indexing statistics, plus the batch job id for longer PDFs
     """
     # Validate course code
     try:
@@ -95,19 +149,27 @@ async def index_textbook(
             detail="File must be a PDF"
         )
     
+    temp_file_path = None
+    
     # Save uploaded file to temporary location
     try:
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as temp_file:
-            content = await textbook_pdf.read()
-            temp_file.write(content)
-            temp_file_path = temp_file.name
+        temp_file_path = await save_upload_to_tempfile(textbook_pdf, '.pdf')
         
         logger.info(f"Indexing textbook for course {course_code}")
         
-        # Index the PDF
-        result = pdf_indexer.index_textbook(course_code, temp_file_path)
+        # Short PDFs are quick to embed directly, so skip the Batch API wait
+        if pdf_indexer.count_pages(temp_file_path) <= SYNC_INDEX_MAX_PAGES:
+            result = await pdf_indexer.index_textbook(course_code, temp_file_path)
+            response.status_code = 200
+            
+            logger.info(f"Indexed {result['pages_indexed']} pages, {result['chunks_indexed']} chunks")
+            
+            return result
         
-        logger.info(f"Successfully indexed {result['pages_indexed']} pages, {result['chunks_indexed']} chunks")
+        # Submit the PDF for batch indexing
+        result = await pdf_indexer.index_textbook_batch(course_code, temp_file_path)
+        
+        logger.info(f"Submitted batch {result['job_id']} for {result['pages_indexed']} pages, {result['chunks_indexed']} chunks")
         
         return result
         
@@ -119,10 +181,49 @@ async def index_textbook(
         )
     finally:
         # Clean up temporary file
-        if os.path.exists(temp_file_path):
+        if temp_file_path and os.path.exists(temp_file_path):
             os.unlink(temp_file_path)
 
 
+@app.get("/index-status/{job_id}")
+async def index_status(
+    job_id: str,
+    _: str = Depends(verify_token)
+):
+    """
+    Check a textbook indexing job, building the index once it completes.
+    
+    Args:
+        job_id: Batch job id returned by /index-textbook
+        
+    Returns:
+        Job status, plus indexing statistics when completed
+    """
+    try:
+        result = await pdf_indexer.get_batch_status(job_id)
+    except NotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Indexing job '{job_id}' not found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error checking indexing job: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error checking indexing job: {str(e)}"
+        )
+    
+    if result["status"] == "completed":
+        logger.info(f"Indexing job {job_id} completed for course {result['course_code']}")
+    
+    return result
+
+
 @app.post("/process")
 async def process_slides(
     course_code: str = Form(...),
@@ -181,17 +282,14 @@ async def process_slides(
     try:
         # Save slides file to temporary file
         file_ext = os.path.splitext(slides_file.filename)[1]
-        with tempfile.NamedTemporaryFile(delete=False, suffix=file_ext) as temp_file:
-            content = await slides_file.read()
-            temp_file.write(content)
-            temp_pptx_path = temp_file.name
+        temp_pptx_path = await save_upload_to_tempfile(slides_file, file_ext)
         
         logger.info(f"Processing slides for course {course_code}")
         
+        # Blocking work runs in worker threads so the event loop keeps serving requests
         # Extract text from slides
         logger.info("Extracting text from slides...")
-        pptx_data = pptx_parser.extract_text_from_slides(temp_pptx_path)
-        slide_text = pptx_data["full_text"]
+        slide_text = await asyncio.to_thread(pptx_parser.extract_full_text, temp_pptx_path)
         
         # Extract key concepts
         logger.info("Extracting key concepts...")
@@ -199,7 +297,8 @@ async def process_slides(
         
         # Retrieve relevant chunks using RAG
         logger.info("Retrieving relevant textbook chunks...")
-        retrieved_chunks = rag_retriever.retrieve_relevant_chunks(
+        retrieved_chunks = await asyncio.to_thread(
+            rag_retriever.retrieve_relevant_chunks,
             course_code=course_code,
             query_text=slide_text,
             top_k=12
@@ -207,29 +306,32 @@ async def process_slides(
         
         # Generate study guide
         logger.info("Generating study guide...")
-        study_guide_content = study_guide_generator.generate_study_guide(
+        study_guide_content = await study_guide_generator.generate_study_guide(
             course_code=course_code,
             slide_text=slide_text,
             key_concepts=key_concepts,
-            retrieved_chunks=retrieved_chunks
+            retrieved_chunks=retrieved_chunks,
+            index_generation=pdf_indexer.index_generation(course_code)
         )
         
         # Create DOCX
         logger.info("Creating DOCX file...")
-        docx_bytes = docx_writer.create_study_guide_docx(
+        docx_buffer = await asyncio.to_thread(
+            docx_writer.create_study_guide_docx,
             content=study_guide_content,
             slides_filename=output_filename,
             course_code=course_code
         )
         
-        # Return DOCX as response
+        # Stream DOCX as response
         response_filename = f"Study Context Guide - {output_filename}.docx"
         
-        return Response(
-            content=docx_bytes,
+        return StreamingResponse(
+            iter_buffer(docx_buffer),
             media_type="application/vnd.openxmlformats-officedocument.wordprocessingml.document",
             headers={
-                "Content-Disposition": f'attachment; filename="{response_filename}"'
+                "Content-Disposition": f'attachment; filename="{response_filename}"',
+                "Content-Length": str(docx_buffer.getbuffer().nbytes)
             }
         )
         
@@ -251,6 +353,146 @@ async def process_slides(
             os.unlink(temp_pptx_path)
 
 
+@app.post("/process-batch")
+async def process_slides_batch(
+    course_code: str = Form(...),
+    slides_files: List[UploadFile] = File(...),
+    _: str = Depends(verify_token)
+):
+    """
+    Process several lecture decks and generate a Study Context Guide for each.
+    
+    All decks are sent to the model in a single chat completion.
+    
+    Args:
+        course_code: Course code
+        slides_files: PPTX or PDF files (at most MAX_BATCH_DECKS)
+        
+    Returns:
+        ZIP archive containing one DOCX file per deck
+    """
+    # Validate course code
+    try:
+        config.get_course_config(course_code)
+    except ValueError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Course code '{course_code}' not found in configuration"
+        )
+    
+    # Check if course is indexed
+    if not pdf_indexer.index_exists(course_code):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Course {course_code} has not been indexed yet. Please index the textbook first."
+        )
+    
+    if len(slides_files) > MAX_BATCH_DECKS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BATCH_DECKS} slides files can be processed per batch"
+        )
+    
+    # Validate file types
+    for slides_file in slides_files:
+        if not (slides_file.filename.endswith('.pptx') or slides_file.filename.endswith('.pdf')):
+            raise HTTPException(
+                status_code=400,
+                detail="Slides files must be PPTX or PDF files"
+            )
+    
+    temp_paths = []
+    
+    try:
+        logger.info(f"Processing {len(slides_files)} slide decks for course {course_code}")
+        
+        slide_texts = []
+        for slides_file in slides_files:
+            file_ext = os.path.splitext(slides_file.filename)[1]
+            temp_path = await save_upload_to_tempfile(slides_file, file_ext)
+            temp_paths.append(temp_path)
+            
+            slide_texts.append(await asyncio.to_thread(pptx_parser.extract_full_text, temp_path))
+        
+        # Embed every deck in one request and search the index once
+        retrieved_chunks_per_deck = await asyncio.to_thread(
+            rag_retriever.retrieve_relevant_chunks_batch,
+            course_code=course_code,
+            query_texts=slide_texts,
+            top_k=12
+        )
+        
+        decks = [
+            {
+                "slide_text": slide_text,
+                "key_concepts": pptx_parser.extract_key_concepts(slide_text),
+                "retrieved_chunks": retrieved_chunks
+            }
+            for slide_text, retrieved_chunks in zip(slide_texts, retrieved_chunks_per_deck)
+        ]
+        
+        # Generate all study guides in one request
+        logger.info("Generating study guides...")
+        study_guides = await study_guide_generator.generate_study_guides_batch(
+            course_code=course_code,
+            decks=decks,
+            index_generation=pdf_indexer.index_generation(course_code)
+        )
+        
+        # Bundle one DOCX per deck into a ZIP archive
+        logger.info("Creating DOCX files...")
+        archive = BytesIO()
+        entry_names = set()
+        with zipfile.ZipFile(archive, 'w', zipfile.ZIP_DEFLATED) as zip_file:
+            for slides_file, study_guide_content in zip(slides_files, study_guides):
+                output_filename = os.path.splitext(slides_file.filename)[0]
+                
+                # Decks with the same name (e.g. lecture.pptx and lecture.pdf) get numbered entries
+                entry_name = f"Study Context Guide - {output_filename}.docx"
+                copy_number = 2
+                while entry_name in entry_names:
+                    entry_name = f"Study Context Guide - {output_filename} ({copy_number}).docx"
+                    copy_number += 1
+                entry_names.add(entry_name)
+                
+                docx_buffer = await asyncio.to_thread(
+                    docx_writer.create_study_guide_docx,
+                    content=study_guide_content,
+                    slides_filename=output_filename,
+                    course_code=course_code
+                )
+                zip_file.writestr(entry_name, docx_buffer.getbuffer())
+        
+        archive.seek(0)
+        
+        return StreamingResponse(
+            iter_buffer(archive),
+            media_type="application/zip",
+            headers={
+                "Content-Disposition": 'attachment; filename="Study Context Guides.zip"',
+                "Content-Length": str(archive.getbuffer().nbytes)
+            }
+        )
+        
+    except FileNotFoundError as e:
+        logger.error(f"File not found: {str(e)}")
+        raise HTTPException(
+            status_code=404,
+            detail=str(e)
+        )
+    except Exception as e:
+        logger.error(f"Error processing slides batch: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error processing slides batch: {str(e)}"
+        )
+    finally:
+        # Clean up temporary files
+        for temp_path in temp_paths:
+            if os.path.exists(temp_path):
+                os.unlink(temp_path)
+
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=8000)
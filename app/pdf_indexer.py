@@ -1,126 +1,234 @@
 """PDF indexing module for CourseAlign API."""
+import asyncio
+import bisect
+import gc
+import math
+import multiprocessing
 import os
-import json
+import threading
+import orjson
 import fitz  # PyMuPDF
 import numpy as np
 import faiss
-from typing import List, Dict, Any, Tuple
-from openai import OpenAI
+from cachetools import LRUCache
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice, repeat
+from pathlib import Path
+from typing import List, Dict, Any, Tuple, Iterable, Iterator, Optional
+from openai import AsyncOpenAI
 from app.config import config
+from app.pdf_text import extract_page_range, extract_page_text
+from app.rate_limiter import RateLimiter
+from app.retry import openai_create_retry, openai_retry
+from app.tokenizer import get_encoding
+
+# OpenAI rate limits for text-embedding-3-small
+MAX_REQUESTS_PER_MINUTE = 3000
+MAX_TOKENS_PER_MINUTE = 1_000_000
+
+# PDFs up to this many pages are embedded directly; larger ones go through the Batch API
+SYNC_INDEX_MAX_PAGES = 200
+
+# Corpora up to this size are searched exhaustively (exact, no graph to build)
+FLAT_MAX_CHUNKS = 1000
+
+# HNSW graph parameters (vectors stored as 8-bit scalar codes)
+HNSW_M = 32  # Neighbors per graph node
+HNSW_EF_CONSTRUCTION = 200
+HNSW_EF_SEARCH = 64
+
+# IVF-PQ parameters for large corpora
+# FAISS k-means wants ~39 training points per centroid; 8-bit PQ trains 256 centroids
+# per sub-quantizer, so smaller corpora stay in HNSW
+IVFPQ_MIN_CHUNKS = 10000
+IVF_POINTS_PER_LIST = 39
+IVFPQ_SUBVECTORS = 96  # 1536 dims -> 96 one-byte codes per vector
+IVFPQ_BITS = 8
+IVFPQ_NPROBE = 16  # Inverted lists scanned per query
+
+# Loaded courses kept resident; least recently used ones are dropped beyond this
+INDEX_CACHE_SIZE = 8
+_NOT_LOADED = object()  # Distinguishes "not cached" from a cached None in _vector_cache
+
+# Page text extraction
+# Pool startup plus reopening the PDF per range outweighs the parallel saving below
+# a few hundred dense pages on two CPUs; lighter pages break even later still
+EXTRACT_PARALLEL_MIN_PAGES = 500
+# Each range reopens the PDF, which costs time proportional to its page count,
+# so split into a few large ranges per worker rather than many small ones
+EXTRACT_RANGES_PER_WORKER = 2
+
+# Workers are forked from a clean server process that has only imported app.pdf_text,
+# not from the threaded API process
+_EXTRACT_CONTEXT = multiprocessing.get_context("forkserver")
+_EXTRACT_CONTEXT.set_forkserver_preload(["app.pdf_text"])
+
+
+def _extract_worker_count() -> int:
+    """Worker processes for PDF extraction, from configuration or the CPU affinity mask."""
+    if config.extract_workers > 0:
+        return config.extract_workers
+    try:
+        available = len(os.sched_getaffinity(0))
+    except AttributeError:  # Not available on macOS
+        available = os.cpu_count() or 1
+    return min(available, 8)
 
 
 class PDFIndexer:
     """Handles PDF text extraction, chunking, embedding, and FAISS indexing."""
     
+    # Loaded (index, chunks) by course_code, shared by all instances
+    _cache: LRUCache = LRUCache(maxsize=INDEX_CACHE_SIZE)
+    # Memory-mapped float32 vectors of quantized indexes (None when there are none), for reranking
+    _vector_cache: LRUCache = LRUCache(maxsize=INDEX_CACHE_SIZE)
+    # Both caches are used from asyncio.to_thread workers, and cachetools caches are not thread-safe
+    _cache_lock = threading.Lock()
+    # Background index builds by batch job id, so overlapping status polls start only one
+    _finalize_tasks: Dict[str, asyncio.Task] = {}
+    
     def __init__(self):
-        self.client = OpenAI(api_key=config.openai_api_key)
+        self.client = AsyncOpenAI(api_key=config.openai_api_key, max_retries=0)
         self.embedding_model = "text-embedding-3-small"
         self.embedding_dimension = 1536
+        self.embedding_concurrency = 8  # Max in-flight embedding requests
+        self.rate_limiter = RateLimiter(MAX_REQUESTS_PER_MINUTE, MAX_TOKENS_PER_MINUTE)
         
-    def extract_text_from_pdf(self, pdf_path: str) -> List[Dict[str, Any]]:
+    def extract_text_from_pdf(self, pdf_path: str) -> Iterator[Tuple[int, str]]:
         """
         Extract text from PDF page by page.
         
+        Pages are yielded in order as they are read, so the text of the
+        whole document is never held in memory at once. Large PDFs are
+        split into page ranges extracted by a process pool.
+        
         Args:
             pdf_path: Path to PDF file
             
-        Returns:
-            List of dicts with page_number and text
+        Yields:
+            Tuples of (page_number, text), 1-indexed
         """
+        max_workers = _extract_worker_count()
+        
         doc = fitz.open(pdf_path)
-        pages = []
-        
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            pages.append({
-                "page_number": page_num + 1,  # 1-indexed
-                "text": text
-            })
+        try:
+            page_count = len(doc)
+            if page_count < EXTRACT_PARALLEL_MIN_PAGES or max_workers == 1:
+                for page_num in range(page_count):
+                    yield page_num + 1, extract_page_text(doc[page_num])
+                return
+        finally:
+            doc.close()
+        
+        # PyMuPDF is not thread-safe, so each worker process opens its own document
+        pages_per_range = math.ceil(page_count / (max_workers * EXTRACT_RANGES_PER_WORKER))
+        starts = range(0, page_count, pages_per_range)
+        stops = [min(start + pages_per_range, page_count) for start in starts]
         
-        doc.close()
-        return pages
+        with ProcessPoolExecutor(max_workers=max_workers, mp_context=_EXTRACT_CONTEXT) as executor:
+            page_number = 1
+            for texts in executor.map(extract_page_range, repeat(pdf_path), starts, stops):
+                for text in texts:
+                    yield page_number, text
+                    page_number += 1
+    
+    def count_pages(self, pdf_path: str) -> int:
+        """Return the number of pages in a PDF."""
+        with fitz.open(pdf_path) as doc:
+            return doc.page_count
     
     def chunk_text(
         self, 
-        pages: List[Dict[str, Any]], 
+        pages: Iterable[Tuple[int, str]], 
         target_words: int = 750, 
         overlap_words: int = 150
     ) -> List[Dict[str, Any]]:
         """
         Chunk text into overlapping segments with metadata.
         
+        Pages are consumed as a stream through a sliding window of words;
+        chunks are emitted as soon as the window fills.
+        
         Args:
-            pages: List of page dicts with page_number and text
+            pages: Iterable of (page_number, text) tuples
             target_words: Target chunk size (600-900 range)
             overlap_words: Overlap between chunks (~150)
             
         Returns:
-            List of chunk dicts with text, page_start, page_end, chunk_id
+            List of chunk dicts with text, page_start, page_end, chunk_id, token_count
         """
         chunks = []
-        chunk_id = 0
-        
-        # Concatenate all text with page markers
-        full_text = ""
-        page_boundaries = []  # Track where each page starts in the full text
-        current_pos = 0
-        
-        for page in pages:
-            page_text = page["text"]
-            full_text += page_text + "\n\n"
-            page_boundaries.append({
-                "page_number": page["page_number"],
-                "start_pos": current_pos,
-                "end_pos": current_pos + len(page_text)
-            })
-            current_pos = len(full_text)
+        step = target_words - overlap_words
+        # Same tokenizer as the study guide model, so stored token counts match prompt budgets
+        encoding = get_encoding()
         
-        # Split into words
-        words = full_text.split()
+        # Global word index at which each page starts
+        page_word_starts = []
+        page_numbers = []
+        words = self._iter_words(pages, page_word_starts, page_numbers)
         
-        i = 0
-        while i < len(words):
-            # Extract chunk
-            chunk_words = words[i:i + target_words]
-            chunk_text = " ".join(chunk_words)
-            
-            # Determine which pages this chunk spans
-            chunk_start_char = len(" ".join(words[:i]))
-            chunk_end_char = chunk_start_char + len(chunk_text)
-            
-            pages_in_chunk = set()
-            for pb in page_boundaries:
-                # Check if chunk overlaps with this page
-                if not (chunk_end_char < pb["start_pos"] or chunk_start_char > pb["end_pos"]):
-                    pages_in_chunk.add(pb["page_number"])
-            
-            if pages_in_chunk:
-                page_start = min(pages_in_chunk)
-                page_end = max(pages_in_chunk)
-            else:
-                page_start = 1
-                page_end = 1
+        window = deque()
+        window_start = 0  # Global index of the first word in the window
+        
+        while True:
+            # Fill the window up to the target size
+            window.extend(islice(words, target_words - len(window)))
+            if not window:
+                break
             
+            text = " ".join(window)
             chunks.append({
-                "chunk_id": chunk_id,
-                "text": chunk_text,
-                "page_start": page_start,
-                "page_end": page_end,
-                "word_count": len(chunk_words)
+                "chunk_id": len(chunks),
+                "text": text,
+                "page_start": self._page_for_word(window_start, page_word_starts, page_numbers),
+                "page_end": self._page_for_word(
+                    window_start + len(window) - 1, page_word_starts, page_numbers
+                ),
+                "word_count": len(window),
+                "token_count": len(encoding.encode(text, disallowed_special=()))
             })
             
-            chunk_id += 1
-            
             # Move forward with overlap
-            i += target_words - overlap_words
+            for _ in range(min(step, len(window))):
+                window.popleft()
+            window_start += step
         
         return chunks
     
-    def create_embeddings(self, texts: List[str]) -> np.ndarray:
+    def _iter_words(
+        self,
+        pages: Iterable[Tuple[int, str]],
+        page_word_starts: List[int],
+        page_numbers: List[int]
+    ) -> Iterator[str]:
+        """Yield words page by page, recording where each page starts."""
+        word_count = 0
+        for page_number, page_text in pages:
+            page_word_starts.append(word_count)
+            page_numbers.append(page_number)
+            page_words = page_text.split()
+            word_count += len(page_words)
+            yield from page_words
+    
+    def _page_for_word(
+        self,
+        word_index: int,
+        page_word_starts: List[int],
+        page_numbers: List[int]
+    ) -> int:
+        """Find the page number containing a global word index."""
+        # Page starts are sorted, so binary search for the last one <= word_index
+        position = bisect.bisect_right(page_word_starts, word_index) - 1
+        return page_numbers[position] if position >= 0 else 1
+    
+    async def create_embeddings(self, texts: List[str]) -> np.ndarray:
         """
         Create embeddings for a list of texts using OpenAI.
         
+        Batches are requested concurrently (bounded by embedding_concurrency)
+        and reassembled in input order.
+        
         Args:
             texts: List of text strings
             
@@ -129,47 +237,105 @@ class PDFIndexer:
         """
         # OpenAI API has limits, batch if needed
         batch_size = 100
-        all_embeddings = []
+        semaphore = asyncio.Semaphore(self.embedding_concurrency)
         
-        for i in range(0, len(texts), batch_size):
-            batch = texts[i:i + batch_size]
-            response = self.client.embeddings.create(
-                model=self.embedding_model,
-                input=batch
-            )
-            embeddings = [item.embedding for item in response.data]
-            all_embeddings.extend(embeddings)
+        # Each batch is copied into its rows as it arrives, so the per-batch
+        # float lists are dropped immediately instead of accumulating
+        all_embeddings = np.empty((len(texts), self.embedding_dimension), dtype=np.float32)
+        
+        async def embed_batch(start: int):
+            batch = texts[start:start + batch_size]
+            async with semaphore:
+                all_embeddings[start:start + len(batch)] = await self._request_embeddings(batch)
+        
+        await asyncio.gather(*(embed_batch(i) for i in range(0, len(texts), batch_size)))
+        
+        return all_embeddings
+    
+    @openai_retry
+    async def _request_embeddings(self, batch: List[str]) -> List[List[float]]:
+        """Request embeddings for a single batch, retrying with backoff."""
+        # Pace requests proactively (~4 chars per token) rather than relying on 429s
+        num_tokens = sum(len(text) // 4 for text in batch)
+        await self.rate_limiter.acquire(1, num_tokens)
         
-        return np.array(all_embeddings, dtype=np.float32)
+        response = await self.client.embeddings.create(
+            model=self.embedding_model,
+            input=batch
+        )
+        return [item.embedding for item in response.data]
     
-    def build_faiss_index(self, embeddings: np.ndarray) -> faiss.IndexFlatL2:
+    def build_faiss_index(self, embeddings: np.ndarray) -> faiss.Index:
         """
         Build FAISS index from embeddings.
         
+        Embeddings are L2-normalized in place so that inner product search
+        ranks by cosine similarity, the native metric for OpenAI embeddings.
+        Small corpora use an exact IndexFlatIP scan. Mid-sized ones use an
+        HNSW graph over 8-bit scalar-quantized vectors, a quarter of the
+        float32 footprint with little recall loss; queries stay float32.
+        Large corpora are product-quantized (IVF-PQ) to cut memory.
+        
         Args:
             embeddings: NumPy array of embeddings
             
         Returns:
             FAISS index
         """
-        dimension = embeddings.shape[1]
-        index = faiss.IndexFlatL2(dimension)
+        num_vectors, dimension = embeddings.shape
+        faiss.normalize_L2(embeddings)
+        
+        if num_vectors >= IVFPQ_MIN_CHUNKS:
+            # 4*sqrt(N) lists, capped so every list still gets enough training points
+            nlist = min(int(4 * math.sqrt(num_vectors)), num_vectors // IVF_POINTS_PER_LIST)
+            index = faiss.index_factory(
+                dimension,
+                f"IVF{nlist},PQ{IVFPQ_SUBVECTORS}x{IVFPQ_BITS}",
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.train(embeddings)
+        elif num_vectors > FLAT_MAX_CHUNKS:
+            index = faiss.IndexHNSWSQ(
+                dimension,
+                faiss.ScalarQuantizer.QT_8bit,
+                HNSW_M,
+                faiss.METRIC_INNER_PRODUCT
+            )
+            index.hnsw.efConstruction = HNSW_EF_CONSTRUCTION
+            index.train(embeddings)
+        else:
+            index = faiss.IndexFlatIP(dimension)
+        
         index.add(embeddings)
+        
+        self._configure_search(index)
         return index
     
+    def _configure_search(self, index: faiss.Index):
+        """Apply query-time search parameters to an index."""
+        if isinstance(index, faiss.IndexHNSW):
+            index.hnsw.efSearch = HNSW_EF_SEARCH
+        elif isinstance(index, faiss.IndexIVF):
+            index.nprobe = IVFPQ_NPROBE
+    
     def save_index(
         self, 
         course_code: str, 
-        index: faiss.IndexFlatL2, 
-        chunks: List[Dict[str, Any]]
+        index: faiss.Index, 
+        chunks: List[Dict[str, Any]],
+        embeddings: Optional[np.ndarray] = None
     ):
         """
         Save FAISS index and chunk metadata to disk.
         
+        Quantized indexes also keep their full-precision vectors in
+        embeddings.npy so search results can be rescored exactly.
+        
         Args:
             course_code: Course code
             index: FAISS index
             chunks: List of chunk dicts with metadata
+            embeddings: Normalized embeddings the index was built from
         """
         course_config = config.get_course_config(course_code)
         index_dir = course_config["index_path"]
@@ -177,26 +343,47 @@ class PDFIndexer:
         # Create directory if it doesn't exist
         os.makedirs(index_dir, exist_ok=True)
         
-        # Save FAISS index
+        # Save FAISS index; files are replaced atomically so a reader never sees a partial write
         index_file = os.path.join(index_dir, "index.faiss")
-        faiss.write_index(index, index_file)
+        faiss.write_index(index, index_file + ".tmp")
+        os.replace(index_file + ".tmp", index_file)
         
         # Save chunks as JSONL
         chunks_file = os.path.join(index_dir, "chunks.jsonl")
-        with open(chunks_file, 'w', encoding='utf-8') as f:
-            for chunk in chunks:
-                f.write(json.dumps(chunk) + "\n")
+        self._write_chunks(chunks_file, chunks)
+        
+        # Exact indexes need no rerank vectors; drop any left by a previous build
+        embeddings_file = os.path.join(index_dir, "embeddings.npy")
+        if embeddings is not None and not isinstance(index, faiss.IndexFlat):
+            with open(embeddings_file + ".tmp", 'wb') as f:
+                np.save(f, embeddings.astype(np.float32, copy=False))
+            os.replace(embeddings_file + ".tmp", embeddings_file)
+        elif os.path.exists(embeddings_file):
+            os.remove(embeddings_file)
+        
+        # Serve the new index immediately instead of a stale cached one
+        with self._cache_lock:
+            self._cache[course_code] = (index, chunks)
+            self._vector_cache.pop(course_code, None)
     
-    def load_index(self, course_code: str) -> Tuple[faiss.IndexFlatL2, List[Dict[str, Any]]]:
+    def load_index(self, course_code: str) -> Tuple[faiss.Index, List[Dict[str, Any]]]:
         """
         Load FAISS index and chunk metadata from disk.
         
+        The most recently used indexes stay resident, so repeat calls for a
+        course skip the disk.
+        
         Args:
             course_code: Course code
             
         Returns:
             Tuple of (FAISS index, list of chunks)
         """
+        with self._cache_lock:
+            cached = self._cache.get(course_code)
+        if cached is not None:
+            return cached
+        
         course_config = config.get_course_config(course_code)
         index_dir = course_config["index_path"]
         
@@ -208,15 +395,50 @@ class PDFIndexer:
         
         # Load FAISS index
         index = faiss.read_index(index_file)
+        self._configure_search(index)
         
         # Load chunks
-        chunks = []
-        with open(chunks_file, 'r', encoding='utf-8') as f:
-            for line in f:
-                chunks.append(json.loads(line))
+        chunks = self._read_chunks(chunks_file)
         
+        with self._cache_lock:
+            self._cache[course_code] = (index, chunks)
         return index, chunks
     
+    def load_embeddings(self, course_code: str) -> Optional[np.ndarray]:
+        """
+        Load the full-precision vectors stored alongside a quantized index.
+        
+        The file is memory-mapped, so only the rows that are read get paged in.
+        
+        Args:
+            course_code: Course code
+            
+        Returns:
+            Read-only (n_chunks, dim) float32 array, or None if the index is exact
+        """
+        with self._cache_lock:
+            cached = self._vector_cache.get(course_code, _NOT_LOADED)
+        if cached is not _NOT_LOADED:
+            return cached
+        
+        course_config = config.get_course_config(course_code)
+        embeddings_file = os.path.join(course_config["index_path"], "embeddings.npy")
+        
+        vectors = np.load(embeddings_file, mmap_mode="r") if os.path.exists(embeddings_file) else None
+        with self._cache_lock:
+            self._vector_cache[course_code] = vectors
+        return vectors
+    
+    def _write_chunks(self, chunks_file: str, chunks: List[Dict[str, Any]]):
+        """Write chunk dicts to a JSONL file."""
+        with open(chunks_file, 'wb') as f:
+            f.writelines(orjson.dumps(chunk) + b"\n" for chunk in chunks)
+    
+    def _read_chunks(self, chunks_file: str) -> List[Dict[str, Any]]:
+        """Read chunk dicts from a JSONL file."""
+        with open(chunks_file, 'rb') as f:
+            return [orjson.loads(line) for line in f]
+    
     def index_exists(self, course_code: str) -> bool:
         """Check if index exists for a course."""
         try:
@@ -227,7 +449,27 @@ class PDFIndexer:
         except (ValueError, KeyError):
             return False
     
-    def index_textbook(self, course_code: str, pdf_path: str) -> Dict[str, Any]:
+    def index_generation(self, course_code: str) -> int:
+        """
+        Identify the current index build for a course.
+        
+        The value changes whenever the index is rebuilt, so it can be used to
+        invalidate results derived from an older index.
+        
+        Args:
+            course_code: Course code
+            
+        Returns:
+            Modification time of the index file in nanoseconds, or 0 if not indexed
+        """
+        course_config = config.get_course_config(course_code)
+        index_file = os.path.join(course_config["index_path"], "index.faiss")
+        try:
+            return os.stat(index_file).st_mtime_ns
+        except FileNotFoundError:
+            return 0
+    
+    async def index_textbook(self, course_code: str, pdf_path: str) -> Dict[str, Any]:
         """
         Complete indexing pipeline for a textbook PDF.
         
@@ -238,28 +480,237 @@ class PDFIndexer:
         Returns:
             Dict with indexing statistics
         """
-        # Extract text from PDF
-        pages = self.extract_text_from_pdf(pdf_path)
-        
-        # Chunk text
-        chunks = self.chunk_text(pages)
+        # Stream text from PDF into chunks (CPU-bound, so off the event loop)
+        page_count = self.count_pages(pdf_path)
+        chunks = await asyncio.to_thread(self.chunk_text, self.extract_text_from_pdf(pdf_path))
         
         # Create embeddings
         chunk_texts = [chunk["text"] for chunk in chunks]
-        embeddings = self.create_embeddings(chunk_texts)
-        
-        # Build FAISS index
-        index = self.build_faiss_index(embeddings)
+        embeddings = await self.create_embeddings(chunk_texts)
         
         # Add course_code to each chunk
         for chunk in chunks:
             chunk["course_code"] = course_code
         
-        # Save index and metadata
-        self.save_index(course_code, index, chunks)
+        # Build and save the FAISS index (CPU and disk bound, so off the event loop)
+        await asyncio.to_thread(self._build_and_save_index, course_code, embeddings, chunks)
+        
+        # Release PyMuPDF and intermediate buffers from the pipeline
+        gc.collect()
         
         return {
+            "status": "completed",
             "course_code": course_code,
-            "pages_indexed": len(pages),
+            "pages_indexed": page_count,
             "chunks_indexed": len(chunks)
         }
+    
+    async def index_textbook_batch(self, course_code: str, pdf_path: str) -> Dict[str, Any]:
+        """
+        Submit a textbook PDF for indexing through the OpenAI Batch API.
+        
+        Chunks are extracted immediately and kept on disk while their
+        embeddings are computed offline. Poll get_batch_status() to build
+        the FAISS index once the batch job completes.
+        
+        Args:
+            course_code: Course code
+            pdf_path: Path to PDF file
+            
+        Returns:
+            Dict with the batch job id and chunking statistics
+        """
+        # Stream text from PDF into chunks (CPU-bound, so off the event loop)
+        page_count = self.count_pages(pdf_path)
+        chunks = await asyncio.to_thread(self.chunk_text, self.extract_text_from_pdf(pdf_path))
+        
+        for chunk in chunks:
+            chunk["course_code"] = course_code
+        
+        course_config = config.get_course_config(course_code)
+        index_dir = course_config["index_path"]
+        os.makedirs(index_dir, exist_ok=True)
+        
+        # One embeddings request per chunk, keyed by chunk_id
+        batch_input_file = os.path.join(index_dir, "batch_input.jsonl")
+        with open(batch_input_file, 'wb') as f:
+            for chunk in chunks:
+                f.write(orjson.dumps({
+                    "custom_id": str(chunk["chunk_id"]),
+                    "method": "POST",
+                    "url": "/v1/embeddings",
+                    "body": {"model": self.embedding_model, "input": chunk["text"]}
+                }) + b"\n")
+        
+        try:
+            input_file = await openai_create_retry(self.client.files.create)(
+                file=Path(batch_input_file),
+                purpose="batch"
+            )
+        finally:
+            os.remove(batch_input_file)
+        
+        batch = await openai_create_retry(self.client.batches.create)(
+            input_file_id=input_file.id,
+            endpoint="/v1/embeddings",
+            completion_window="24h",
+            metadata={
+                "course_code": course_code,
+                "pages_indexed": str(page_count)
+            }
+        )
+        
+        # Keep chunk metadata until the embeddings come back
+        self._write_chunks(self._pending_chunks_file(index_dir, batch.id), chunks)
+        
+        # Release PyMuPDF and intermediate buffers from the pipeline
+        gc.collect()
+        
+        return {
+            "job_id": batch.id,
+            "status": batch.status,
+            "course_code": course_code,
+            "pages_indexed": page_count,
+            "chunks_indexed": len(chunks)
+        }
+    
+    async def get_batch_status(self, job_id: str) -> Dict[str, Any]:
+        """
+        Check a batch indexing job, building the FAISS index once it completes.
+        
+        The first poll after the job completes starts the index build in the
+        background and reports "finalizing" until it is done. A job whose
+        embedding requests did not all succeed is reported as "failed".
+        
+        Args:
+            job_id: Batch job id returned by index_textbook_batch
+            
+        Returns:
+            Dict with job status, plus indexing statistics when completed
+        """
+        batch = await openai_retry(self.client.batches.retrieve)(job_id)
+        metadata = batch.metadata or {}
+        course_code = metadata.get("course_code")
+        
+        if course_code is None:
+            raise ValueError(f"Batch {job_id} is not a textbook indexing job")
+        
+        course_config = config.get_course_config(course_code)
+        pending_file = self._pending_chunks_file(course_config["index_path"], job_id)
+        
+        status = {
+            "job_id": job_id,
+            "status": batch.status,
+            "course_code": course_code
+        }
+        
+        if batch.status in ("failed", "expired", "cancelled"):
+            if os.path.exists(pending_file):
+                os.remove(pending_file)
+            return status
+        
+        if batch.status != "completed":
+            return status
+        
+        # Chunks whose requests failed have no embedding, so the index can never be built
+        failed_requests = batch.request_counts.failed if batch.request_counts else 0
+        if failed_requests or not batch.output_file_id:
+            if os.path.exists(pending_file):
+                os.remove(pending_file)
+            status["status"] = "failed"
+            status["error"] = (
+                f"{failed_requests} embedding requests failed (error file {batch.error_file_id})"
+                if failed_requests else "Batch job produced no output"
+            )
+            return status
+        
+        # Building can take minutes, so it runs in the background rather than inside this request
+        task = self._finalize_tasks.get(job_id)
+        if task is None and os.path.exists(pending_file):
+            task = asyncio.create_task(
+                self._finalize_batch(course_code, batch.output_file_id, pending_file)
+            )
+            self._finalize_tasks[job_id] = task
+        
+        if task is not None:
+            if not task.done():
+                status["status"] = "finalizing"
+                return status
+            # A failed build keeps the pending file, so the next poll starts it again
+            del self._finalize_tasks[job_id]
+            task.result()
+        
+        status["pages_indexed"] = int(metadata.get("pages_indexed", 0))
+        status["chunks_indexed"] = batch.request_counts.completed if batch.request_counts else 0
+        return status
+    
+    async def _finalize_batch(self, course_code: str, output_file_id: str, pending_file: str):
+        """Download batch embeddings, then build and save the FAISS index."""
+        # Stream the output to disk instead of holding the whole file in memory
+        output_file = os.path.join(os.path.dirname(pending_file), f"output_{output_file_id}.jsonl")
+        try:
+            await self._download_file(output_file_id, output_file)
+            
+            # Parsing, index building, and saving are CPU and disk bound, so keep them off the event loop
+            await asyncio.to_thread(
+                self._build_index_from_batch_output, course_code, output_file, pending_file
+            )
+        finally:
+            if os.path.exists(output_file):
+                os.remove(output_file)
+    
+    @openai_retry
+    async def _download_file(self, file_id: str, path: str):
+        """Stream an OpenAI file's content to a local path."""
+        async with self.client.files.with_streaming_response.content(file_id) as response:
+            with open(path, 'wb') as f:
+                async for data in response.iter_bytes():
+                    f.write(data)
+    
+    def _build_index_from_batch_output(self, course_code: str, output_file: str, pending_file: str):
+        """Parse batch output into embeddings, build and save the index, then drop the pending file."""
+        chunks = self._read_chunks(pending_file)
+        
+        # Output lines are not guaranteed to be in input order, so map each id to its row
+        row_by_id = {str(chunk["chunk_id"]): row for row, chunk in enumerate(chunks)}
+        embeddings = np.empty((len(chunks), self.embedding_dimension), dtype=np.float32)
+        filled = np.zeros(len(chunks), dtype=bool)
+        
+        # Each line is written straight into the array, so only one embedding is ever a Python list
+        with open(output_file, 'rb') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = orjson.loads(line)
+                response = record.get("response") or {}
+                if response.get("status_code") != 200:
+                    raise RuntimeError(
+                        f"Embedding request {record.get('custom_id')} failed: {record.get('error')}"
+                    )
+                row = row_by_id.get(record["custom_id"])
+                if row is None:
+                    continue
+                embeddings[row] = response["body"]["data"][0]["embedding"]
+                filled[row] = True
+        
+        missing = len(chunks) - int(np.count_nonzero(filled))
+        if missing:
+            raise RuntimeError(f"Batch output is missing embeddings for {missing} chunks")
+        
+        self._build_and_save_index(course_code, embeddings, chunks)
+        
+        os.remove(pending_file)
+    
+    def _build_and_save_index(
+        self,
+        course_code: str,
+        embeddings: np.ndarray,
+        chunks: List[Dict[str, Any]]
+    ):
+        """Build a FAISS index from embeddings and save it with its chunks."""
+        index = self.build_faiss_index(embeddings)
+        self.save_index(course_code, index, chunks, embeddings)
+    
+    def _pending_chunks_file(self, index_dir: str, job_id: str) -> str:
+        """Path of the chunk metadata kept while a batch job is running."""
+        return os.path.join(index_dir, f"pending_{job_id}.jsonl")
@@ -0,0 +1,21 @@
+"""PDF page text extraction for CourseAlign API."""
+# Extraction worker processes import only this module, so keep it free of the
+# indexing stack (OpenAI, FAISS, tokenizer)
+from typing import List
+import fitz  # PyMuPDF
+
+PAGE_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT | fitz.TEXT_DEHYPHENATE
+
+
+def extract_page_text(page) -> str:
+    """Extract one page's plain text, joining hyphenated line breaks."""
+    return page.get_text("text", flags=PAGE_TEXT_FLAGS)
+
+
+def extract_page_range(pdf_path: str, start: int, stop: int) -> List[str]:
+    """Extract text for pages [start, stop) in a worker process."""
+    doc = fitz.open(pdf_path)
+    try:
+        return [extract_page_text(doc[page_num]) for page_num in range(start, stop)]
+    finally:
+        doc.close()
@@ -1,8 +1,89 @@
 """PPTX and PDF parsing module for CourseAlign API."""
 from pptx import Presentation
+from lxml import etree
 import fitz  # PyMuPDF
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Iterable, Iterator
+import io
 import os
+import re
+
+# Plain text in reading order; ligatures are expanded so words match textbook chunks
+PDF_TEXT_FLAGS = fitz.TEXTFLAGS_TEXT & ~fitz.TEXT_PRESERVE_LIGATURES
+
+# Separator between slides in concatenated deck text
+SLIDE_BREAK = "\n\n---SLIDE BREAK---\n\n"
+
+# Key concept lines: "Title: ..." or a bullet starting with -, • or *
+_KEY_CONCEPT_RE = re.compile(r"^\s*(?:Title:(.*)|[-•*][-•* ]*(.*))", re.MULTILINE)
+
+# Paragraphs plus their run, field, and line-break text in document order, in one lxml call
+_TEXT_NODES_XPATH = etree.XPath(
+    "./p:txBody/a:p | ./p:txBody/a:p/a:r/a:t | ./p:txBody/a:p/a:fld/a:t | ./p:txBody/a:p/a:br",
+    namespaces={
+        "a": "http://schemas.openxmlformats.org/drawingml/2006/main",
+        "p": "http://schemas.openxmlformats.org/presentationml/2006/main"
+    }
+)
+_PARAGRAPH_TAG = "{http://schemas.openxmlformats.org/drawingml/2006/main}p"
+_LINE_BREAK_TAG = "{http://schemas.openxmlformats.org/drawingml/2006/main}br"
+
+
+def _shape_text(shape_element) -> str:
+    """
+    Read a shape's text straight from its XML.
+    
+    Matches python-pptx's shape.text (paragraphs joined by newlines, line
+    breaks as vertical tabs) without building run and paragraph proxies.
+    """
+    paragraphs = []
+    for node in _TEXT_NODES_XPATH(shape_element):
+        if node.tag == _PARAGRAPH_TAG:
+            paragraphs.append([])
+        elif node.tag == _LINE_BREAK_TAG:
+            paragraphs[-1].append("\v")
+        else:
+            paragraphs[-1].append(node.text or "")
+    return "\n".join("".join(parts) for parts in paragraphs)
+
+
+def _extract_slide_text(slide) -> str:
+    """Extract title, body text, and speaker notes from one slide."""
+    slide_text_parts = []
+    
+    # Looking up the title walks the shape tree, so do it once per slide
+    title_shape = slide.shapes.title
+    title_element = title_shape._element if title_shape is not None else None
+    
+    # Extract title
+    if title_shape is not None:
+        title = _shape_text(title_element)
+        if title.strip():
+            slide_text_parts.append(f"Title: {title}")
+    
+    # Extract text from shapes
+    for shape in slide.shapes:
+        # Shape proxies are rebuilt on every iteration, so compare the underlying XML element
+        if not shape.has_text_frame or shape._element is title_element:
+            continue
+        text = _shape_text(shape._element)
+        if text.strip():
+            slide_text_parts.append(text)
+    
+    # Extract speaker notes
+    if slide.has_notes_slide:
+        notes_placeholder = slide.notes_slide.notes_placeholder
+        if notes_placeholder is not None:
+            notes_text = _shape_text(notes_placeholder._element)
+            if notes_text.strip():
+                slide_text_parts.append(f"Speaker Notes: {notes_text}")
+    
+    return "\n".join(slide_text_parts)
+
+
+def _pdf_page_text(page) -> str:
+    """Extract one PDF page's text; blank pages become an empty string."""
+    text = page.get_text("text", flags=PDF_TEXT_FLAGS, sort=True)
+    return text if text.strip() else ""
 
 
 class PPTXParser:
@@ -27,6 +108,40 @@ class PPTXParser:
         else:
             raise ValueError(f"Unsupported file type: {file_ext}")
     
+    def extract_text_streaming(self, file_path: str) -> Iterator[Dict[str, Any]]:
+        """
+        Extract text from a slides file (PPTX or PDF) one slide at a time.
+        
+        Args:
+            file_path: Path to PPTX or PDF file
+            
+        Returns:
+            Iterator of slide dicts with slide_number and text, in slide order
+        """
+        file_ext = os.path.splitext(file_path)[1].lower()
+        
+        if file_ext == '.pptx':
+            return self._iter_pptx_slides(file_path)
+        elif file_ext == '.pdf':
+            return self._iter_pdf_slides(file_path)
+        else:
+            raise ValueError(f"Unsupported file type: {file_ext}")
+    
+    def extract_full_text(self, file_path: str) -> str:
+        """
+        Extract the concatenated text of a slides file without keeping per-slide data.
+        
+        Args:
+            file_path: Path to PPTX or PDF file
+            
+        Returns:
+            Text of every slide, separated by slide breaks
+        """
+        full_text = io.StringIO()
+        for slide in self.extract_text_streaming(file_path):
+            self._write_slide(full_text, slide)
+        return full_text.getvalue()
+    
     def extract_text_from_pptx(self, pptx_path: str) -> Dict[str, Any]:
         """
         Extract text from PPTX file including titles, bullets, and speaker notes.
@@ -37,50 +152,7 @@ class PPTXParser:
         Returns:
             Dict with slide_texts (list of dicts) and full_text (concatenated)
         """
-        prs = Presentation(pptx_path)
-        slides_data = []
-        
-        for slide_num, slide in enumerate(prs.slides, start=1):
-            slide_text_parts = []
-            
-            # Extract title
-            if slide.shapes.title:
-                title = slide.shapes.title.text
-                if title.strip():
-                    slide_text_parts.append(f"Title: {title}")
-            
-            # Extract text from shapes
-            for shape in slide.shapes:
-                if hasattr(shape, "text") and shape.text.strip():
-                    # Skip if it's the title (already extracted)
-                    if shape == slide.shapes.title:
-                        continue
-                    slide_text_parts.append(shape.text)
-            
-            # Extract speaker notes
-            if slide.has_notes_slide:
-                notes_slide = slide.notes_slide
-                notes_text = notes_slide.notes_text_frame.text
-                if notes_text.strip():
-                    slide_text_parts.append(f"Speaker Notes: {notes_text}")
-            
-            slide_text = "\n".join(slide_text_parts)
-            
-            slides_data.append({
-                "slide_number": slide_num,
-                "text": slide_text
-            })
-        
-        # Concatenate all slide text
-        full_text = "\n\n---SLIDE BREAK---\n\n".join(
-            [f"Slide {s['slide_number']}:\n{s['text']}" for s in slides_data]
-        )
-        
-        return {
-            "slides": slides_data,
-            "full_text": full_text,
-            "slide_count": len(slides_data)
-        }
+        return self._collect_slides(self._iter_pptx_slides(pptx_path))
     
     def extract_text_from_pdf(self, pdf_path: str) -> Dict[str, Any]:
         """
@@ -92,31 +164,46 @@ class PPTXParser:
         Returns:
             Dict with slides (list of dicts) and full_text (concatenated)
         """
+        return self._collect_slides(self._iter_pdf_slides(pdf_path))
+    
+    def _iter_pptx_slides(self, pptx_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield PPTX slides in order."""
+        prs = Presentation(pptx_path)
+        for slide_num, slide in enumerate(prs.slides, start=1):
+            yield {"slide_number": slide_num, "text": _extract_slide_text(slide)}
+    
+    def _iter_pdf_slides(self, pdf_path: str) -> Iterator[Dict[str, Any]]:
+        """Yield PDF pages as slides in order."""
         doc = fitz.open(pdf_path)
+        try:
+            for page_num in range(len(doc)):
+                yield {"slide_number": page_num + 1, "text": _pdf_page_text(doc[page_num])}
+        finally:
+            doc.close()
+    
+    def _collect_slides(self, slides: Iterable[Dict[str, Any]]) -> Dict[str, Any]:
+        """Gather streamed slides into slide data plus concatenated text."""
         slides_data = []
+        full_text = io.StringIO()
         
-        for page_num in range(len(doc)):
-            page = doc[page_num]
-            text = page.get_text()
-            
-            slides_data.append({
-                "slide_number": page_num + 1,
-                "text": text
-            })
-        
-        doc.close()
-        
-        # Concatenate all slide text
-        full_text = "\n\n---SLIDE BREAK---\n\n".join(
-            [f"Slide {s['slide_number']}:\n{s['text']}" for s in slides_data]
-        )
+        for slide in slides:
+            self._write_slide(full_text, slide)
+            slides_data.append(slide)
         
         return {
             "slides": slides_data,
-            "full_text": full_text,
+            "full_text": full_text.getvalue(),
             "slide_count": len(slides_data)
         }
     
+    def _write_slide(self, full_text: io.StringIO, slide: Dict[str, Any]):
+        """Append one slide to the concatenated text, preceded by a break after the first."""
+        if full_text.tell():
+            full_text.write(SLIDE_BREAK)
+        # Header and body are written separately so the slide text is never copied into a new string
+        full_text.write(f"Slide {slide['slide_number']}:\n")
+        full_text.write(slide["text"])
+    
     def extract_key_concepts(self, slide_text: str) -> List[str]:
         """
         Extract key concepts from slide text.
@@ -128,29 +215,17 @@ class PPTXParser:
         Returns:
             List of key concept strings
         """
-        concepts = []
-        lines = slide_text.split("\n")
+        # Lowercased concept -> first spelling seen, in order of appearance
+        unique_concepts = {}
         
-        for line in lines:
-            line = line.strip()
-            # Extract titles
-            if line.startswith("Title:"):
-                concept = line.replace("Title:", "").strip()
-                if concept and len(concept) > 3:
-                    concepts.append(concept)
-            # Extract bullet points (typically start with -, •, or *)
-            elif line and (line[0] in ['-', '•', '*'] or line.startswith("- ")):
-                concept = line.lstrip('-•* ').strip()
-                if concept and len(concept) > 3:
-                    concepts.append(concept)
-        
-        # Remove duplicates while preserving order
-        seen = set()
-        unique_concepts = []
-        for concept in concepts:
-            concept_lower = concept.lower()
-            if concept_lower not in seen:
-                seen.add(concept_lower)
-                unique_concepts.append(concept)
+        for match in _KEY_CONCEPT_RE.finditer(slide_text):
+            title, bullet = match.groups()
+            if title is not None:
+                concept = title.replace("Title:", "").strip()
+            else:
+                concept = bullet.strip()
+            
+            if len(concept) > 3:
+                unique_concepts.setdefault(concept.lower(), concept)
         
-        return unique_concepts
+        return list(unique_concepts.values())
@@ -1,24 +1,41 @@
 """RAG retrieval module for CourseAlign API."""
+import hashlib
+import threading
 import numpy as np
+import faiss
 from typing import List, Dict, Any
+from cachetools import TTLCache
 from openai import OpenAI
 from app.pdf_indexer import PDFIndexer
 from app.config import config
+from app.retry import openai_retry
+
+# Shared by all retrievers so connection pools are reused
+_OPENAI = OpenAI(api_key=config.openai_api_key, max_retries=0)
+
+# Candidates fetched per requested chunk before exact rescoring of quantized indexes
+RERANK_CANDIDATE_FACTOR = 4
 
 
 class RAGRetriever:
     """Handles retrieval of relevant textbook chunks using RAG."""
     
-    def __init__(self):
-        self.client = OpenAI(api_key=config.openai_api_key)
-        self.indexer = PDFIndexer()
+    def __init__(self, indexer: PDFIndexer):
+        self.client = _OPENAI
+        # Share the app's indexer rather than building another embeddings client and rate limiter
+        self.indexer = indexer
         self.embedding_model = "text-embedding-3-small"
+        # Query embeddings as raw float32 bytes keyed by text hash; re-uploaded slides reuse them
+        self._embedding_cache = TTLCache(maxsize=4096, ttl=86400)
+        # Retrieval runs in worker threads, and cachetools caches are not thread-safe
+        self._embedding_cache_lock = threading.Lock()
     
     def retrieve_relevant_chunks(
         self, 
         course_code: str, 
         query_text: str, 
-        top_k: int = 12
+        top_k: int = 12,
+        rerank: bool = True
     ) -> List[Dict[str, Any]]:
         """
         Retrieve top-k most relevant chunks from course textbook.
@@ -27,30 +44,149 @@ class RAGRetriever:
             course_code: Course code
             query_text: Query text (e.g., slide content)
             top_k: Number of chunks to retrieve
+            rerank: Rescore candidates from quantized indexes with exact vectors
             
         Returns:
             List of chunk dicts with relevance scores
         """
+        return self.retrieve_relevant_chunks_batch(course_code, [query_text], top_k, rerank)[0]
+    
+    def retrieve_relevant_chunks_batch(
+        self,
+        course_code: str,
+        query_texts: List[str],
+        top_k: int = 12,
+        rerank: bool = True
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Retrieve top-k chunks for several queries with one embedding request and one search.
+        
+        For quantized indexes with stored full-precision vectors, reranking
+        fetches RERANK_CANDIDATE_FACTOR * top_k candidates and rescores them
+        exactly, recovering recall lost to compression.
+        
+        Args:
+            course_code: Course code
+            query_texts: Query texts (e.g., the content of several decks)
+            top_k: Number of chunks to retrieve per query
+            rerank: Rescore candidates from quantized indexes with exact vectors
+            
+        Returns:
+            One list of chunk dicts with relevance scores per query, in input order
+        """
+        if not query_texts:
+            return []
+        
         # Load index and chunks
         index, chunks = self.indexer.load_index(course_code)
         
-        # Create embedding for query
-        response = self.client.embeddings.create(
-            model=self.embedding_model,
-            input=[query_text]
-        )
-        query_embedding = np.array([response.data[0].embedding], dtype=np.float32)
+        # Create embeddings for all queries, shape (n_queries, dim)
+        query_embeddings = self._embed_queries(query_texts)
+        
+        # Inner-product indexes hold normalized vectors, so scores are cosine similarities
+        if index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            faiss.normalize_L2(query_embeddings)
+        
+        # Exact rescoring needs the stored vectors, which only quantized inner-product indexes have
+        vectors = None
+        if rerank and index.metric_type == faiss.METRIC_INNER_PRODUCT:
+            vectors = self.indexer.load_embeddings(course_code)
         
         # Search FAISS index
-        distances, indices = index.search(query_embedding, min(top_k, len(chunks)))
-        
-        # Prepare results
-        results = []
-        for i, (distance, idx) in enumerate(zip(distances[0], indices[0])):
-            if idx < len(chunks):  # Ensure valid index
-                chunk = chunks[idx].copy()
-                chunk["relevance_score"] = float(distance)
-                chunk["rank"] = i + 1
-                results.append(chunk)
-        
-        return results
+        k = min(top_k, len(chunks))
+        if vectors is None:
+            distances, indices = index.search(query_embeddings, k)
+        else:
+            _, candidates = index.search(query_embeddings, min(RERANK_CANDIDATE_FACTOR * k, len(chunks)))
+            distances, indices = self._rerank(query_embeddings, candidates, vectors, k)
+        
+        # Prepare results; -1 pads short IVF result lists, so mask out invalid ids first
+        valid = (indices >= 0) & (indices < len(chunks))
+        all_results = []
+        for query_distances, query_indices, query_valid in zip(distances, indices, valid):
+            # tolist() converts to Python ints/floats in one pass instead of per element
+            hits = zip(query_indices[query_valid].tolist(), query_distances[query_valid].tolist())
+            all_results.append([
+                {
+                    "chunk_id": chunks[idx]["chunk_id"],
+                    "text": chunks[idx]["text"],
+                    "page_start": chunks[idx]["page_start"],
+                    "page_end": chunks[idx]["page_end"],
+                    "token_count": chunks[idx].get("token_count"),  # Absent in older indexes
+                    "relevance_score": distance,
+                    "rank": rank
+                }
+                for rank, (idx, distance) in enumerate(hits, start=1)
+            ])
+        
+        return all_results
+    
+    def _rerank(
+        self,
+        query_embeddings: np.ndarray,
+        candidates: np.ndarray,
+        vectors: np.ndarray,
+        k: int
+    ):
+        """
+        Rescore candidate ids with exact inner products and keep the best k per query.
+        
+        Args:
+            query_embeddings: Normalized queries, shape (n_queries, dim)
+            candidates: Candidate ids from the coarse search, -1 where missing
+            vectors: Full-precision normalized chunk vectors
+            k: Number of results to keep per query
+            
+        Returns:
+            Tuple of (scores, ids) arrays shaped (n_queries, k), padded with -1 ids
+        """
+        distances = np.full((len(candidates), k), -np.inf, dtype=np.float32)
+        indices = np.full((len(candidates), k), -1, dtype=np.int64)
+        
+        for row, (query, candidate_ids) in enumerate(zip(query_embeddings, candidates)):
+            # Sorted ids read the memory-mapped vectors sequentially
+            candidate_ids = np.sort(candidate_ids[candidate_ids >= 0])
+            scores = vectors[candidate_ids] @ query
+            
+            keep = min(k, len(candidate_ids))
+            if keep == 0:
+                continue
+            best = np.argpartition(-scores, keep - 1)[:keep]
+            best = best[np.argsort(-scores[best])]
+            distances[row, :keep] = scores[best]
+            indices[row, :keep] = candidate_ids[best]
+        
+        return distances, indices
+    
+    def _embed_queries(self, query_texts: List[str]) -> np.ndarray:
+        """Embed queries in one request, reusing cached embeddings for repeated text."""
+        cache_keys = [hashlib.sha256(text.encode()).hexdigest() for text in query_texts]
+        
+        with self._embedding_cache_lock:
+            cached = [self._embedding_cache.get(key) for key in cache_keys]
+        missing = [i for i, embedding in enumerate(cached) if embedding is None]
+        
+        # Only texts that are not cached go to the API, deduplicated
+        fetched = {}
+        if missing:
+            missing_keys = list(dict.fromkeys(cache_keys[i] for i in missing))
+            texts_by_key = {cache_keys[i]: query_texts[i] for i in missing}
+            response = self._create_embeddings([texts_by_key[key] for key in missing_keys])
+            for key, item in zip(missing_keys, response.data):
+                fetched[key] = np.array(item.embedding, dtype=np.float32).tobytes()
+            with self._embedding_cache_lock:
+                self._embedding_cache.update(fetched)
+        
+        # Bytes are immutable, so callers can normalize the stacked copy in place
+        return np.vstack([
+            np.frombuffer(cached[i] if cached[i] is not None else fetched[cache_keys[i]], dtype=np.float32)
+            for i in range(len(query_texts))
+        ])
+    
+    @openai_retry
+    def _create_embeddings(self, texts: List[str]):
+        """Create embeddings, retrying transient API errors with backoff."""
+        return self.client.embeddings.create(
+            model=self.embedding_model,
+            input=texts
+        )
@@ -0,0 +1,61 @@
+"""Rate limiting module for CourseAlign API."""
+import asyncio
+import time
+
+
+class RateLimiter:
+    """Token-bucket limiter tracking both requests and tokens per minute."""
+
+    def __init__(self, max_requests_per_minute: float, max_tokens_per_minute: float):
+        self.max_requests_per_minute = max_requests_per_minute
+        self.max_tokens_per_minute = max_tokens_per_minute
+        self.available_request_capacity = float(max_requests_per_minute)
+        self.available_token_capacity = float(max_tokens_per_minute)
+        self._last_update = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Restore capacity in proportion to the time since the last update."""
+        now = time.monotonic()
+        elapsed = now - self._last_update
+        self._last_update = now
+
+        self.available_request_capacity = min(
+            self.available_request_capacity + self.max_requests_per_minute * elapsed / 60.0,
+            self.max_requests_per_minute
+        )
+        self.available_token_capacity = min(
+            self.available_token_capacity + self.max_tokens_per_minute * elapsed / 60.0,
+            self.max_tokens_per_minute
+        )
+
+    async def acquire(self, num_requests: int = 1, num_tokens: int = 0):
+        """
+        Wait until enough request and token capacity is available, then consume it.
+
+        Args:
+            num_requests: Number of requests about to be made
+            num_tokens: Estimated number of tokens those requests consume
+        """
+        # A single call can never need more than a full bucket
+        num_requests = min(num_requests, self.max_requests_per_minute)
+        num_tokens = min(num_tokens, self.max_tokens_per_minute)
+
+        async with self._lock:
+            while True:
+                self._refill()
+
+                if (self.available_request_capacity >= num_requests
+                        and self.available_token_capacity >= num_tokens):
+                    self.available_request_capacity -= num_requests
+                    self.available_token_capacity -= num_tokens
+                    return
+
+                # Sleep just long enough for the larger deficit to refill
+                request_deficit = num_requests - self.available_request_capacity
+                token_deficit = num_tokens - self.available_token_capacity
+                wait_seconds = 60.0 * max(
+                    request_deficit / self.max_requests_per_minute,
+                    token_deficit / self.max_tokens_per_minute
+                )
+                await asyncio.sleep(max(wait_seconds, 0.001))
@@ -0,0 +1,24 @@
+"""Retry policy for OpenAI API calls."""
+from openai import APIConnectionError, InternalServerError, RateLimitError
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_random_exponential
+
+# Transient failures worth retrying; other API errors (bad request, auth) fail fast
+RETRYABLE_ERRORS = (RateLimitError, APIConnectionError, InternalServerError)
+
+# Exponential backoff with jitter; works on both sync and async callables.
+# OpenAI clients are created with max_retries=0 so this is the only retry layer.
+openai_retry = retry(
+    retry=retry_if_exception_type(RETRYABLE_ERRORS),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True
+)
+
+# For calls that create server-side objects (uploads, batch jobs): a connection
+# drop or 5xx may come after the object was created, so only retry rejections.
+openai_create_retry = retry(
+    retry=retry_if_exception_type(RateLimitError),
+    wait=wait_random_exponential(min=1, max=60),
+    stop=stop_after_attempt(6),
+    reraise=True
+)
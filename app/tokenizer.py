@@ -0,0 +1,17 @@
+"""Shared tokenizer for CourseAlign API."""
+from functools import lru_cache
+import tiktoken
+
+# Study guide model; chunk token counts and prompt budgets are measured in its tokens
+TOKENIZER_MODEL = "gpt-4o-mini"
+
+
+@lru_cache(maxsize=None)
+def get_encoding() -> tiktoken.Encoding:
+    """
+    Return the tokenizer for the study guide model.
+
+    Loaded on first use rather than at import, since tiktoken may need to
+    download the encoding; importing the app then works without network access.
+    """
+    return tiktoken.encoding_for_model(TOKENIZER_MODEL)
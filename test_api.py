@@ -2,28 +2,49 @@
 import requests
 import sys
 import os
+import time
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Load environment variables
 load_dotenv()
 
 API_URL = os.getenv("API_URL", "http://127.0.0.1:8000")
 API_TOKEN = os.getenv("COURSEALIGN_API_SECRET")
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # Study guides are written to disk as they arrive
 
 if not API_TOKEN:
     print("ERROR: COURSEALIGN_API_SECRET not found in environment variables")
     print("Please set it in your .env file or export it")
     sys.exit(1)
 
+# One pooled session for every call; idempotent requests retry on gateway errors
+SESSION = requests.Session()
+SESSION.headers["Authorization"] = f"Bearer {API_TOKEN}"
+_adapter = HTTPAdapter(
+    pool_connections=4,
+    pool_maxsize=8,
+    # Once retries run out, return the last response so callers print it like any other error
+    max_retries=Retry(
+        total=3,
+        backoff_factor=0.5,
+        status_forcelist=(502, 503, 504),
+        raise_on_status=False
+    )
+)
+SESSION.mount("http://", _adapter)
+SESSION.mount("https://", _adapter)
+
 def test_health():
     """Test health endpoint."""
-    response = requests.get(f"{API_URL}/health")
+    response = SESSION.get(f"{API_URL}/health")
     print("Health check:", response.json())
     return response.status_code == 200
 
 def test_courses():
     """Test courses endpoint."""
-    response = requests.get(f"{API_URL}/courses")
+    response = SESSION.get(f"{API_URL}/courses")
     print("Courses:", response.json())
     return response.status_code == 200
 
@@ -32,46 +53,73 @@ def index_textbook(course_code, textbook_path):
     print(f"\nIndexing textbook for {course_code}...")
     
     with open(textbook_path, 'rb') as f:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/index-textbook",
-            headers={"Authorization": f"Bearer {API_TOKEN}"},
             data={"course_code": course_code},
             files={"textbook_pdf": f}
         )
     
+    # Short PDFs are indexed before the response; longer ones start a batch job
     if response.status_code == 200:
         result = response.json()
         print(f"✓ Successfully indexed {result['pages_indexed']} pages, {result['chunks_indexed']} chunks")
         return True
-    else:
+    
+    if response.status_code != 202:
         print(f"✗ Error: {response.status_code}")
         print(response.text)
         return False
+    
+    job_id = response.json()["job_id"]
+    print(f"Submitted indexing job {job_id}, waiting for completion...")
+    
+    # Poll until the batch job finishes
+    while True:
+        response = SESSION.get(f"{API_URL}/index-status/{job_id}")
+        
+        if response.status_code != 200:
+            print(f"✗ Error: {response.status_code}")
+            print(response.text)
+            return False
+        
+        result = response.json()
+        if result["status"] == "completed":
+            print(f"✓ Successfully indexed {result['pages_indexed']} pages, {result['chunks_indexed']} chunks")
+            return True
+        if result["status"] in ("failed", "expired", "cancelled"):
+            print(f"✗ Indexing job {result['status']}")
+            if "error" in result:
+                print(result["error"])
+            return False
+        
+        time.sleep(10)
 
 def process_slides(course_code, slides_path, output_path="Study_Context_Guide.docx"):
     """Process lecture slides and generate study guide."""
     print(f"\nProcessing slides for {course_code}...")
     
     with open(slides_path, 'rb') as f:
-        response = requests.post(
+        response = SESSION.post(
             f"{API_URL}/process",
-            headers={"Authorization": f"Bearer {API_TOKEN}"},
             data={
                 "course_code": course_code,
                 "output_format": "docx"
             },
-            files={"slides_file": f}
+            files={"slides_file": f},
+            stream=True
         )
     
-    if response.status_code == 200:
-        with open(output_path, 'wb') as out:
-            out.write(response.content)
-        print(f"✓ Study guide saved to: {output_path}")
-        return True
-    else:
-        print(f"✗ Error: {response.status_code}")
-        print(response.text)
-        return False
+    with response:
+        if response.status_code == 200:
+            with open(output_path, 'wb') as out:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    out.write(chunk)
+            print(f"✓ Study guide saved to: {output_path}")
+            return True
+        else:
+            print(f"✗ Error: {response.status_code}")
+            print(response.text)
+            return False
 
 if __name__ == "__main__":
     print("=== CourseAlign API Test ===\n")